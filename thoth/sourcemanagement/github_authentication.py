@@ -17,15 +17,23 @@
 
 """Handle Github APP Authentication."""
 
-from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
 import jwt
-import requests
 import time
-import json
 import os
 from pathlib import Path
+from typing import Dict, Optional, Union
+
+from .session import create_session
 
 _BASE_URL = "https://api.github.com/"
+# Maximum number of characters of an error response reported.
+_ERROR_MESSAGE_MAX_LENGTH = 500
+# JWT expiration time (10 minute maximum).
+_JWT_EXPIRATION = 10 * 60
+# Generate a new JWT this many seconds before the current one expires.
+_JWT_EXPIRATION_MARGIN = 30
 
 
 class GithubAuthentication:
@@ -34,15 +42,43 @@ class GithubAuthentication:
     def __init__(self, slug: str) -> None:
         """Initialize and check values."""
         self.slug = slug
+        self._http = create_session()
 
         self.github_private_key_path = str(os.getenv("GITHUB_PRIVATE_KEY_PATH"))
         self._file_path = Path(self.github_private_key_path)
-        self.github_private_key = None
+        self.github_app_id = os.getenv("GITHUB_APP_ID", None)
+
+        if not self.github_app_id:
+            raise ValueError(
+                "Cannot authenticate as Github because of missing values. \
+                    Please check if APP ID and Private key are set."
+            )
+
+        # Private key is read on first use.
+        self.github_private_key: Optional[str] = None
+        self.cert_str: Optional[str] = None
+        self.cert_bytes: Optional[bytes] = None
+        self._private_key: Optional[rsa.RSAPrivateKey] = None
+
+        self._header: Optional[Dict[str, str]] = None
+        self._header_expire_time = 0
+        # JWT payload, only times are updated when a new JWT is generated.
+        self._payload: Dict[str, Union[int, str]] = {
+            # GitHub App's identifier
+            "iss": str(self.github_app_id),
+        }
+        # Installation of the application for the repository does not change, it is looked up once.
+        self._installation_id: Optional[int] = None
+
+    def _load_private_key(self) -> rsa.RSAPrivateKey:
+        """Read and parse the private key of Github application if not done yet."""
+        if self._private_key is not None:
+            return self._private_key
+
         with open(self._file_path, "r") as f:
             self.github_private_key = f.read()
-        self.github_app_id = os.getenv("GITHUB_APP_ID", None)
 
-        if not self.github_app_id or not self.github_private_key:
+        if not self.github_private_key:
             raise ValueError(
                 "Cannot authenticate as Github because of missing values. \
                     Please check if APP ID and Private key are set."
@@ -50,39 +86,52 @@ class GithubAuthentication:
         # Read and encode
         self.cert_str = self.github_private_key
         self.cert_bytes = self.cert_str.encode()
+        private_key = serialization.load_pem_private_key(self.cert_bytes, password=None)
+        if not isinstance(private_key, rsa.RSAPrivateKey):
+            raise ValueError("Cannot authenticate as Github because the private key is not an RSA key.")
+        self._private_key = private_key
+        return private_key
 
-    def _get_header(self):
-        """Get the application headers for authentication."""
+    def _get_header(self) -> Dict[str, str]:
+        """Get the application headers for authentication, reuse them while the JWT is valid."""
         time_since_epoch_in_seconds = int(time.time())
-        private_key = default_backend().load_pem_private_key(self.cert_bytes, None)
-        payload = {
-            # issued at time
-            "iat": time_since_epoch_in_seconds,
-            # JWT expiration time (10 minute maximum)
-            "exp": time_since_epoch_in_seconds + (10 * 60),
-            # GitHub App's identifier
-            "iss": str(self.github_app_id),
-        }
-        jwt_generated = jwt.encode(payload, private_key, algorithm="RS256")
+        if self._header and time_since_epoch_in_seconds < self._header_expire_time - _JWT_EXPIRATION_MARGIN:
+            return self._header
+
+        expire_time = time_since_epoch_in_seconds + _JWT_EXPIRATION
+        # issued at time
+        self._payload["iat"] = time_since_epoch_in_seconds
+        # JWT expiration time (10 minute maximum)
+        self._payload["exp"] = expire_time
+        jwt_generated = jwt.encode(self._payload, self._load_private_key(), algorithm="RS256")
 
-        headers = {
+        self._header = {
             "Authorization": "Bearer {}".format(jwt_generated),
             "Accept": "application/vnd.github.machine-man-preview+json",
         }
-        return headers
+        self._header_expire_time = expire_time
+        return self._header
 
     def get_access_token(self) -> str:
         """Fetch the installation ID and use it get the access token."""
         # Logic to fetch installation id of a repo
         # https://docs.github.com/en/free-pro-team@latest/rest/reference/apps#get-a-repository-installation-for-the-authenticated-app
-        response = requests.get("{}repos/{}/installation".format(_BASE_URL, self.slug), headers=self._get_header())
-        installation_id = json.loads(response.content.decode()).get("id")
+        headers = self._get_header()
+        if self._installation_id is None:
+            response = self._http.get("{}repos/{}/installation".format(_BASE_URL, self.slug), headers=headers)
+            if response.status_code != 200:
+                raise ValueError(
+                    f"Installation couldn't be fetched. Error - {response.text[:_ERROR_MESSAGE_MAX_LENGTH]}"
+                )
+            self._installation_id = response.json().get("id")
 
         # This is the request to fetch the oauth token.
-        response = requests.post(
-            "{}app/installations/{}/access_tokens".format(_BASE_URL, installation_id), headers=self._get_header()
+        response = self._http.post(
+            "{}app/installations/{}/access_tokens".format(_BASE_URL, self._installation_id), headers=headers
         )
         if response.status_code != 201:
-            raise ValueError(f"Access token couldn't be fetched. Error - {response.content.decode()}")
-        response_dict: dict = json.loads(response.content.decode())
+            # The application could have been reinstalled, look up the installation again next time.
+            self._installation_id = None
+            raise ValueError(f"Access token couldn't be fetched. Error - {response.text[:_ERROR_MESSAGE_MAX_LENGTH]}")
+        response_dict: dict = response.json()
         return response_dict.get("token")  # type: ignore
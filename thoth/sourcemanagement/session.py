@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# Source Management
+# Copyright(C) 2020 Sai Sankar Gochhayat
+#
+# This program is free software: you can redistribute it and / or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""HTTP session used for direct calls to git forge APIs."""
+
+import hashlib
+import threading
+import typing
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util import Retry
+
+# (etag, last modified, status code, headers, body)
+_CacheEntry = typing.Tuple[typing.Optional[str], typing.Optional[str], int, CaseInsensitiveDict, bytes]
+
+
+class ConditionalSession(requests.Session):
+    """A session revalidating GET responses using ETag and Last-Modified headers.
+
+    Responses to conditional requests answered with 304 Not Modified do not count against
+    the GitHub rate limit, so polling an unchanged resource is served from the cache.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        """Initialize the session with an empty response cache."""
+        super().__init__()
+        self._max_entries = max_entries
+        self._cache: typing.Dict[typing.Tuple[str, str], _CacheEntry] = {}
+        # The session is shared by threads making requests concurrently.
+        self._cache_lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(request: requests.PreparedRequest) -> typing.Tuple[str, str]:
+        """Compute cache key for the given request, responses differ per credentials used."""
+        authorization = request.headers.get("Authorization", "")
+        return request.url or "", hashlib.sha256(authorization.encode()).hexdigest()
+
+    def send(self, request: requests.PreparedRequest, **kwargs: typing.Any) -> requests.Response:
+        """Send the given request, revalidating a cached response if available."""
+        if request.method != "GET" or kwargs.get("stream"):
+            return super().send(request, **kwargs)
+
+        key = self._cache_key(request)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if entry:
+            etag, last_modified = entry[0], entry[1]
+            if etag:
+                request.headers["If-None-Match"] = etag
+            if last_modified:
+                request.headers["If-Modified-Since"] = last_modified
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and entry:
+            return self._cached_response(request, response, entry)
+
+        if response.status_code == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self._store(key, (etag, last_modified, response.status_code, response.headers, response.content))
+        elif entry:
+            with self._cache_lock:
+                self._cache.pop(key, None)
+
+        return response
+
+    def _store(self, key: typing.Tuple[str, str], entry: _CacheEntry) -> None:
+        """Store the given cache entry, dropping the oldest one if the cache is full."""
+        with self._cache_lock:
+            self._cache.pop(key, None)
+            if len(self._cache) >= self._max_entries:
+                self._cache.pop(next(iter(self._cache)), None)
+            self._cache[key] = entry
+
+    @staticmethod
+    def _cached_response(
+        request: requests.PreparedRequest, not_modified: requests.Response, entry: _CacheEntry
+    ) -> requests.Response:
+        """Construct a response out of a cache entry for a request answered with 304 Not Modified."""
+        _, _, status_code, headers, content = entry
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers = CaseInsensitiveDict(headers)
+        # Rate limit information is up to date only in the 304 response.
+        response.headers.update({k: v for k, v in not_modified.headers.items() if k.lower().startswith("x-ratelimit-")})
+        response._content = content
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = not_modified.url
+        response.request = request
+        response.reason = "OK"
+        response.elapsed = not_modified.elapsed
+        return response
+
+
+def create_session() -> ConditionalSession:
+    """Create a session keeping connections alive and retrying on intermittent server errors."""
+    session = ConditionalSession()
+    # Give up with the last response obtained, callers check status codes on their own.
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -23,24 +23,70 @@ import functools
 from typing import Optional, Tuple
 from ogr.services.github import service  # noqa: F401
 from typing import Any
-import requests
 from urllib.parse import quote_plus
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 
 from ogr.services.github import GithubService
 from ogr.services.gitlab import GitlabService
 
 from .github_authentication import GithubAuthentication
+from .session import create_session
 from .enums import ServiceType
 from ogr.abstract import Issue
 from ogr.abstract import PullRequest
 from .exception import CannotFetchPRError
 from .exception import CannotFetchBranchesError
 from .exception import CreatePRError
-import json
 import datetime
+import threading
+import time
 
 _LOGGER = logging.getLogger(__name__)
+_T = typing.TypeVar("_T")
+_R = typing.TypeVar("_R")
 BASE_URL = {"github": "https://api.github.com", "gitlab": "https://gitlab.com//api/v4"}
+_SERVICES = {ServiceType.GITHUB: GithubService, ServiceType.GITLAB: GitlabService}
+# Installation access token expires after 10 mins, refresh it a bit earlier.
+_TOKEN_EXPIRATION = datetime.timedelta(minutes=9, seconds=30)
+# Number of seconds open issues listed are reused when looking up issues by title.
+_ISSUE_INDEX_TTL = 60
+# Maximum number of concurrent requests made to the service.
+_MAX_WORKERS = 8
+# Maximum number of items per page allowed by GitHub and GitLab.
+_PAGE_SIZE = 100
+# GitHub rejects search queries longer than 256 characters.
+_GITHUB_SEARCH_QUERY_MAX_LENGTH = 256
+
+
+def _map_concurrently(func: typing.Callable[[_T], _R], items: typing.Sequence[_T]) -> typing.List[_R]:
+    """Call the given function on items concurrently, results are returned in the order of items."""
+    if not items:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(_MAX_WORKERS, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def _api_base_url(service_type: ServiceType, service_url: Optional[str]) -> Optional[str]:
+    """Get base URL of the REST API for the given service instance, None if it cannot be derived."""
+    if not service_url:
+        return BASE_URL[service_type.name.lower()]
+
+    parsed = urlparse(service_url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return None
+
+    instance_url = service_url.rstrip("/")
+    if service_type == ServiceType.GITHUB:
+        if parsed.hostname in ("github.com", "www.github.com", "api.github.com"):
+            return BASE_URL["github"]
+        # GitHub Enterprise Server serves the REST API under /api/v3.
+        return f"{instance_url}/api/v3"
+
+    if parsed.hostname in ("gitlab.com", "www.gitlab.com"):
+        return BASE_URL["gitlab"]
+    return f"{instance_url}/api/v4"
 
 
 class SourceManagement:
@@ -66,48 +112,117 @@ class SourceManagement:
         self.token = token
         self.namespace, self.repo = slug.rsplit("/", 1)
         self.installation = installation
-        # token expires after 10 mins
-        self.token_expire_time = datetime.datetime.now() + datetime.timedelta(minutes=9, seconds=30)
-        self.github_auth_obj = None
+        self.token_expire_time = datetime.datetime.now() + _TOKEN_EXPIRATION
+        self._token_expire_monotonic = time.monotonic() + _TOKEN_EXPIRATION.total_seconds()
+        self.github_auth_obj: Optional[GithubAuthentication] = None
+        self._token_lock = threading.Lock()
+        # Connections are kept alive across calls, GET requests are revalidated using ETag/Last-Modified.
+        self._http = create_session()
+        # Search API has its own (low) rate limit, do not use it until the limit is reset.
+        self._search_rate_limit_reset = 0.0
+        # Open issues by their title, see get_issue.
+        self._issue_index: Optional[typing.Dict[str, Issue]] = None
+        self._issue_index_time = 0.0
+        self._issue_index_lock = threading.RLock()
+        # Authentication and OGR objects are created on first use.
+        self._initialized = False
+        self._service: Any = None
+        self._repository: Any = None
+        self._api_base: Optional[str] = None
 
         if not installation and not token:
             raise ValueError("Token nor Installation ID found during initialization.")
-        if installation:
+
+    def _ensure_initialized(self) -> None:
+        """Authenticate and initialize OGR objects if not done yet."""
+        if self._initialized:
+            return
+
+        if self.installation:
             self.github_auth_obj = GithubAuthentication(self.slug)
             self.token = self.github_auth_obj.get_access_token()
+            self.token_expire_time = datetime.datetime.now() + _TOKEN_EXPIRATION
+            self._token_expire_monotonic = time.monotonic() + _TOKEN_EXPIRATION.total_seconds()
 
         # Initialize ogr service object
         self._init_helper()
+        self._initialized = True
+
+    @property
+    def service(self) -> Any:  # noqa: F811
+        """Get OGR service object, initialize it on first access."""
+        self._ensure_initialized()
+        return self._service
+
+    @property
+    def repository(self) -> Any:
+        """Get OGR project object, initialize it on first access."""
+        self._ensure_initialized()
+        return self._repository
 
     def _init_helper(self):
         """Handle the initialization or reinitialization of OGR object."""
+        service_class = _SERVICES.get(self.service_type)
+        if service_class is None:
+            raise NotImplementedError
+
+        # URLs and authentication used in direct API calls, headers are updated in place on token refresh.
+        # Issues are looked up using OGR if the API of the service instance is not known.
+        self._api_base = _api_base_url(self.service_type, self.service_url)
+        api_base = self._api_base or BASE_URL[self.service_type.name.lower()]
         if self.service_type == ServiceType.GITHUB:
-            if self.service_url:
-                self.service = GithubService(self.token, instance_url=self.service_url)
-            else:
-                self.service = GithubService(self.token)
-            self.repository = self.service.get_project(repo=self.repo, namespace=self.namespace)
-        elif self.service_type == ServiceType.GITLAB:
-            if self.service_url:
-                self.service = GitlabService(self.token, instance_url=self.service_url)
-            else:
-                self.service = GitlabService(self.token)
-            self.repository = self.service.get_project(repo=self.repo, namespace=self.namespace)
+            self._project_url = f"{api_base}/repos/{self.slug}"
         else:
-            raise NotImplementedError
+            self._project_url = f"{api_base}/projects/{quote_plus(self.slug)}"
+        self._auth_headers = {"Authorization": f"token {self.token}"}
+        self._auth_params = {"private_token": self.token}
+
+        kwargs = {"token": self.token}
+        if self.service_url:
+            kwargs["instance_url"] = self.service_url
+        self._service = service_class(**kwargs)
+        self._init_project()
+
+    def _init_project(self) -> None:
+        """Initialize OGR project object, OGR lists all the pages of issues, pull requests and branches."""
+        self._repository = self._service.get_project(repo=self.repo, namespace=self.namespace)
+        if self.service_type == ServiceType.GITHUB:
+            # Fewer requests are needed with larger pages, PyGithub uses 30 items per page by default.
+            # The project obtains its own PyGithub instance from the service, configure that one.
+            self._repository.github_instance.per_page = _PAGE_SIZE
+        elif self.service_type == ServiceType.GITLAB:
+            # python-gitlab uses 20 items per page by default. Accessing the instance authenticates, OGR does so
+            # anyway on first use of the project. A new instance is created when the token is changed.
+            self._service.gitlab_instance.per_page = _PAGE_SIZE
+
+    def _rotate_token(self, token: str) -> None:
+        """Use the given token for all the calls made, keep the OGR service object."""
+        self.token = token
+        self.token_expire_time = datetime.datetime.now() + _TOKEN_EXPIRATION
+        self._token_expire_monotonic = time.monotonic() + _TOKEN_EXPIRATION.total_seconds()
+        self._auth_headers["Authorization"] = f"token {token}"
+        self._auth_params["private_token"] = token
+        self._service.change_token(token)
+        # OGR project and issues listed hold objects obtained with the previous token.
+        self._init_project()
+        with self._issue_index_lock:
+            self._issue_index = None
 
     def refresh_access_token(decorated: Any):  # noqa: N805
         """Check if access token as expired and refresh if necessary."""
 
         @functools.wraps(decorated)
         def wrapper(sourcemanagement, *args, **kwargs):
-            if sourcemanagement.installation:  # We check if installation is being used.
-                if datetime.datetime.now() > sourcemanagement.token_expire_time:
-                    sourcemanagement.token = sourcemanagement.github_auth_obj.get_access_token()
-                    sourcemanagement.token_expire_time = datetime.datetime.now() + datetime.timedelta(
-                        minutes=9, seconds=30
-                    )
-                return decorated(sourcemanagement, *args, **kwargs)
+            sourcemanagement._ensure_initialized()
+            # Only installation tokens expire, the decorated method is always called exactly once.
+            # Monotonic clock is cheap to query and not affected by system clock changes.
+            if sourcemanagement.installation and time.monotonic() > sourcemanagement._token_expire_monotonic:
+                with sourcemanagement._token_lock:
+                    # Another thread could have refreshed the token in the meantime.
+                    if time.monotonic() > sourcemanagement._token_expire_monotonic:
+                        sourcemanagement._rotate_token(sourcemanagement.github_auth_obj.get_access_token())
+
+            return decorated(sourcemanagement, *args, **kwargs)
 
         return wrapper
 
@@ -116,15 +231,141 @@ class SourceManagement:
         """Retrieve the current access token and expire time from the class variables."""
         return self.token, self.token_expire_time
 
-    @refresh_access_token
-    def get_issue(self, title: str) -> Issue:
-        """Retrieve issue with the given title."""
+    def _search_issue_by_title(self, title: str) -> Optional[typing.List[int]]:
+        """Search for open issues with the given title, return None if the search API cannot be used."""
+        if self._api_base is None or time.time() < self._search_rate_limit_reset:
+            return None
+
+        if self.service_type == ServiceType.GITHUB:
+            # Search is fuzzy and quotes cannot be escaped, exact match is checked on results.
+            query = 'repo:{} is:issue is:open in:title "{}"'.format(self.slug, title.replace('"', " "))
+            if len(query) > _GITHUB_SEARCH_QUERY_MAX_LENGTH:
+                return None
+            response = self._http.get(
+                f"{self._api_base}/search/issues",
+                params={"q": query, "sort": "updated", "order": "desc", "per_page": str(_PAGE_SIZE)},
+                headers=self._auth_headers,
+            )
+        elif self.service_type == ServiceType.GITLAB:
+            response = self._http.get(
+                f"{self._project_url}/issues",
+                params={
+                    "search": title,
+                    "in": "title",
+                    "state": "opened",
+                    "order_by": "updated_at",
+                    "per_page": str(_PAGE_SIZE),
+                    **self._auth_params,
+                },
+            )
+        else:
+            raise NotImplementedError
+
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            self._search_rate_limit_reset = float(response.headers.get("X-RateLimit-Reset", time.time() + 60))
+
+        if response.status_code != 200:
+            _LOGGER.debug(f"Issue search failed with status {response.status_code}, listing issues instead")
+            return None
+
+        if self.service_type == ServiceType.GITHUB:
+            result = response.json()
+            if result.get("incomplete_results"):
+                return None
+            numbers = [item["number"] for item in result["items"] if item["title"] == title]
+            has_more = result.get("total_count", 0) > len(result["items"])
+        else:
+            numbers = [item["iid"] for item in response.json() if item["title"] == title]
+            has_more = "next" in response.links
+
+        if not numbers and has_more:
+            # The issue could be on a next page of fuzzy matches, let the caller list issues instead.
+            return None
+
+        return numbers
+
+    def _index_issues(self) -> typing.Dict[str, Issue]:
+        """List open issues and index them by their title."""
+        issue_index: typing.Dict[str, Issue] = {}
         for issue in self.repository.get_issue_list():
-            if issue._raw_issue.title == title:
-                return issue
+            # Keep the first match (the most recently updated issue), as listing issues one by one did.
+            issue_index.setdefault(issue._raw_issue.title, issue)
+
+        with self._issue_index_lock:
+            self._issue_index = issue_index
+            self._issue_index_time = time.monotonic()
+
+        return issue_index
+
+    def _get_issue_index(self) -> typing.Dict[str, Issue]:
+        """Get open issues indexed by their title, list them again if the index is outdated."""
+        with self._issue_index_lock:
+            if self._issue_index is None or time.monotonic() - self._issue_index_time > _ISSUE_INDEX_TTL:
+                return self._index_issues()
+
+            return self._issue_index
+
+    @refresh_access_token
+    def prime_issue_cache(self) -> None:
+        """List open issues once, so that a batch of issues can be looked up by title without listing them again."""
+        self._index_issues()
+
+    def _scan_issue_by_title(self, title: str) -> Optional[int]:
+        """List open issues page by page until the one with the given title is found, return its number."""
+        if self._api_base is None:
+            for issue in self.repository.get_issue_list():
+                if issue._raw_issue.title == title:
+                    return issue.id
+            return None
+
+        if self.service_type == ServiceType.GITHUB:
+            params: Optional[typing.Dict[str, str]] = {
+                "state": "open",
+                "sort": "updated",
+                "direction": "desc",
+                "per_page": str(_PAGE_SIZE),
+            }
+            headers = self._auth_headers
+            number_key = "number"
+        elif self.service_type == ServiceType.GITLAB:
+            params = {"state": "opened", "order_by": "updated_at", "per_page": str(_PAGE_SIZE)}
+            # Links to next pages do not carry the token, pass it in a header.
+            headers = {"PRIVATE-TOKEN": self._auth_params["private_token"] or ""}
+            number_key = "iid"
+        else:
+            raise NotImplementedError
+
+        url: Optional[str] = f"{self._project_url}/issues"
+        while url:
+            response = self._http.get(url, params=params, headers=headers)
+            response.raise_for_status()
+            for item in response.json():
+                # GitHub lists pull requests as issues.
+                if "pull_request" not in item and item["title"] == title:
+                    return item[number_key]
+            # Link to the next page already includes query parameters.
+            url = response.links.get("next", {}).get("url")
+            params = None
 
         return None
 
+    @refresh_access_token
+    def get_issue(self, title: str, use_cache: bool = True) -> Optional[Issue]:
+        """Retrieve issue with the given title.
+
+        Open issues listed are cached for a while, so that looking up issues in a loop does not list them repeatedly.
+        Pass use_cache=False to query the service directly.
+        """
+        if use_cache:
+            return self._get_issue_index().get(title)
+
+        numbers = self._search_issue_by_title(title)
+        if numbers is None:
+            number = self._scan_issue_by_title(title)
+            numbers = [number] if number is not None else []
+
+        return self.repository.get_issue(numbers[0]) if numbers else None
+
     @refresh_access_token
     def open_issue_if_not_exist(
         self,
@@ -148,8 +389,11 @@ class SourceManagement:
             else:
                 _LOGGER.debug("Refresh comment not added")
         else:
-            issue = self.repository.create_issue(title, body())
-            issue.add_label(*set(labels or []))
+            # Set labels in the request creating the issue rather than adding them one by one afterwards.
+            issue = self.repository.create_issue(title, body(), labels=list(set(labels or [])))
+            with self._issue_index_lock:
+                if self._issue_index is not None:
+                    self._issue_index[title] = issue
             _LOGGER.info(f"Reported issue {title!r} with id #{issue.id}")
 
         return issue
@@ -164,42 +408,62 @@ class SourceManagement:
 
         issue.comment(comment)
         issue.close()
+        # Another open issue could have the same title, list issues again on next lookup.
+        with self._issue_index_lock:
+            self._issue_index = None
 
     @refresh_access_token
     def _github_assign(self, issue: Issue, assignees: typing.List[str]) -> None:
         """Assign the given users to a particular issue."""
         data = {"assignees": assignees}
-        response = requests.Session().post(
-            f"{BASE_URL['github']}/repos/{self.slug}/issues/{issue.id}/assignees",
-            headers={"Authorization": f"token {self.token}"},
+        response = self._http.post(
+            f"{self._project_url}/issues/{issue.id}/assignees",
+            headers=self._auth_headers,
             json=data,
         )
 
         response.raise_for_status()
 
+    @refresh_access_token
+    def _github_add_labels(self, number: int, labels: typing.List[str]) -> None:
+        """Add the given labels to an issue or a pull request in one request."""
+        if not labels:
+            return
+
+        response = self._http.post(
+            f"{self._project_url}/issues/{number}/labels",
+            headers=self._auth_headers,
+            json={"labels": labels},
+        )
+
+        response.raise_for_status()
+
     @refresh_access_token
     def _gitlab_fetch_userid(self, usernames: typing.List[str]) -> typing.List[int]:
         """Fetch the corresponding user ids for usernames."""
-        user_ids = []
-        for username in usernames:
-            response = requests.Session().get(
-                f"{BASE_URL['gitlab']}/users?username={username}",
-                headers={"Authorization": f"token {self.token}"},
+
+        def fetch_userid(username: str) -> Optional[int]:
+            response = self._http.get(
+                f"{self._api_base or BASE_URL['gitlab']}/users?username={username}",
+                headers=self._auth_headers,
             )
-            res = json.loads(response.text)
-            userid = res.pop().get("id")
-            if userid:
-                user_ids.append(userid)
-        return user_ids
+            response.raise_for_status()
+            for user in response.json():
+                if user.get("username", "").lower() == username.lower():
+                    return user.get("id")
+            return None
+
+        # GitLab looks up users one by one, do not wait for responses sequentially.
+        return [userid for userid in _map_concurrently(fetch_userid, usernames) if userid]
 
     @refresh_access_token
     def _gitlab_assign(self, issue: Issue, assignees: typing.List[str]) -> None:
         """Assign the given users to a particular issue. Gitlab assignee id's are different from username."""
         assignees_ids = self._gitlab_fetch_userid(assignees)
         data = {"assignee_ids": assignees_ids}
-        response = requests.Session().put(
-            f"{BASE_URL['gitlab']}/projects/{quote_plus(self.slug)}/issues/{issue.id}",
-            params={"private_token": self.token},
+        response = self._http.put(
+            f"{self._project_url}/issues/{issue.id}",
+            params=self._auth_params,
             json=data,
         )
 
@@ -224,7 +488,11 @@ class SourceManagement:
                 merge_request = self.repository.create_pr(commit_msg, body, "master", branch_name, self.namespace)
             else:
                 merge_request = self.repository.create_pr(commit_msg, body, "master", branch_name)
-            merge_request.add_label(*labels)
+            labels = list(set(labels or []))
+            if self.service_type == ServiceType.GITHUB:
+                self._github_add_labels(merge_request.id, labels)
+            else:
+                merge_request.add_label(*labels)
 
         except Exception as exc:
             raise CreatePRError(f"Failed to create a pull request: {exc}")
@@ -232,25 +500,33 @@ class SourceManagement:
             _LOGGER.info(f"Newly created pull request #{merge_request.id} available at {merge_request.url}")
             return merge_request
 
-    @refresh_access_token
-    def _github_delete_branch(self, branch: str) -> None:
-        """Delete the given branch from remote repository."""
-        response = requests.Session().delete(
-            f"{BASE_URL['github']}/repos/{self.slug}/git/refs/heads/{branch}",
-            headers={"Authorization": f"token {self.token}"},
-        )
+    def _delete_branch_request(self, branch: str) -> None:
+        """Delete the given branch from remote repository, the access token is not refreshed."""
+        if self.service_type == ServiceType.GITHUB:
+            response = self._http.delete(
+                f"{self._project_url}/git/refs/heads/{branch}",
+                headers=self._auth_headers,
+            )
+        elif self.service_type == ServiceType.GITLAB:
+            response = self._http.delete(
+                f"{self._project_url}/repository/branches/{branch}",
+                params=self._auth_params,
+            )
+        else:
+            raise NotImplementedError
 
         response.raise_for_status()
         # GitHub returns an empty string, noting to return.
 
+    @refresh_access_token
+    def _github_delete_branch(self, branch: str) -> None:
+        """Delete the given branch from remote repository."""
+        self._delete_branch_request(branch)
+
     @refresh_access_token
     def _gitlab_delete_branch(self, branch: str) -> None:
         """Delete the given branch from remote repository."""
-        response = requests.Session().delete(
-            f"{BASE_URL['gitlab']}/projects/{quote_plus(self.slug)}/repository/branches/{branch}",
-            params={"private_token": self.token},
-        )
-        response.raise_for_status()
+        self._delete_branch_request(branch)
 
     @refresh_access_token
     def list_branches(self) -> set:
@@ -282,3 +558,12 @@ class SourceManagement:
             return self._gitlab_delete_branch(branch_name)
         else:
             raise NotImplementedError
+
+    @refresh_access_token
+    def delete_branches(self, branch_names: typing.List[str]) -> None:
+        """Delete the given branches from remote, branches are deleted concurrently."""
+        if self.service_type not in (ServiceType.GITHUB, ServiceType.GITLAB):
+            raise NotImplementedError
+
+        # The token was refreshed for this call, workers do not check it again.
+        _map_concurrently(self._delete_branch_request, branch_names)